@@ -1,7 +1,191 @@
-import random
+import functools
+import io
 import math
+import numpy as np
+from numba import njit
 from qubots.base_problem import BaseProblem
 import os
+import pathlib
+
+
+# Non-integer times and rooms are clipped to this magnitude when converted to int64.
+_INT64_LIMIT = 2 ** 62
+
+# Set to cross-check every evaluate_solution call against the plain-Python reference.
+_CHECK_REFERENCE = bool(os.environ.get("SURGERIES_SCHEDULING_CHECK_REFERENCE"))
+
+
+@njit(cache=True)
+def _evaluate(sdata, needed_nurses, incompat_mask, shift_early, shift_late, max_shift, num_rooms,
+              starts, ends, rooms, nurse_assign_flat, nurse_assign_offsets):
+    """
+    Numeric core of SurgeriesSchedulingProblem.evaluate_solution, compiled with numba.
+
+    The instance data comes first so that it can be bound once per problem instance; the
+    remaining arguments describe the candidate.
+
+    sdata has one row per surgery, (min_start, max_end, duration), so the fields of a surgery
+    are adjacent in memory. starts, ends and rooms have one entry per surgery. Nurse assignments
+    are passed in CSR form: nurse n works
+    nurse_assign_flat[nurse_assign_offsets[n]:nurse_assign_offsets[n + 1]]; entries that are not
+    surgery indices are dropped and penalized. incompat_mask packs each surgery's incompatible rooms into uint64
+    words, room r being bit r % 64 of word r // 64.
+
+    Time differences are taken and summed in float64, as in the original evaluation, so
+    arbitrarily large int64 times cannot overflow.
+
+    Returns (makespan, penalty).
+    """
+    violations = 0.0
+
+    # Time windows and durations.
+    for s in range(starts.shape[0]):
+        start = np.float64(starts[s])
+        end = np.float64(ends[s])
+        if start < sdata[s, 0]:
+            violations += sdata[s, 0] - start
+        if end > sdata[s, 1]:
+            violations += end - sdata[s, 1]
+        violations += abs((end - start) - sdata[s, 2])
+
+    # Room compatibility; out-of-range rooms are left out of the overlap check.
+    in_range = np.zeros(rooms.shape[0], dtype=np.bool_)
+    for s in range(rooms.shape[0]):
+        r = rooms[s]
+        if r < 0 or r >= num_rooms:
+            violations += 1
+        else:
+            in_range[s] = True
+            if (incompat_mask[s, r >> 6] >> np.uint64(r & 63)) & np.uint64(1):
+                violations += 1
+
+    # Room overlaps: stable sort by start, then by room, so each room's surgeries form one
+    # contiguous run; only neighbours inside a run can overlap, and each overlapping pair
+    # costs end[s1] - start[s2].
+    order = np.flatnonzero(in_range)
+    order = order[np.argsort(starts[order], kind="mergesort")]
+    order = order[np.argsort(rooms[order], kind="mergesort")]
+    sorted_rooms = rooms[order]
+    sorted_starts = starts[order].astype(np.float64)
+    sorted_ends = ends[order].astype(np.float64)
+    same_room = sorted_rooms[1:] == sorted_rooms[:-1]
+    overlap = np.maximum(sorted_ends[:-1] - sorted_starts[1:], 0)
+    violations += (overlap * same_room).sum()
+
+    # Nurse lists: entries outside [0, num_surgeries) cost one violation each and are
+    # dropped, compacting the lists; the rest are counted for the coverage check.
+    num_surgeries = sdata.shape[0]
+    flat = np.empty_like(nurse_assign_flat)
+    offsets = np.empty_like(nurse_assign_offsets)
+    nurse_count = np.zeros(num_surgeries, dtype=np.int64)
+    kept = 0
+    offsets[0] = 0
+    for n in range(offsets.shape[0] - 1):
+        for i in range(nurse_assign_offsets[n], nurse_assign_offsets[n + 1]):
+            s = nurse_assign_flat[i]
+            if s < 0 or s >= num_surgeries:
+                violations += 1
+            else:
+                flat[kept] = s
+                nurse_count[s] += 1
+                kept += 1
+        offsets[n + 1] = kept
+
+    # Nurse coverage.
+    violations += np.maximum(needed_nurses - nurse_count, 0).sum()
+
+    # Nurse shift limits, from the first and last surgery of every nurse with work.
+    lo = offsets[:-1]
+    hi = offsets[1:]
+    working = np.flatnonzero(hi > lo)
+    first_start = starts[flat[lo[working]]].astype(np.float64)
+    last_end = ends[flat[hi[working] - 1]].astype(np.float64)
+    violations += np.maximum(shift_early[working] - first_start, 0).sum()
+    violations += np.maximum(last_end - shift_late[working], 0).sum()
+    violations += np.maximum(last_end - first_start - max_shift, 0).sum()
+
+    # Nurse order: a list is out of order as soon as one start time decreases.
+    for n in working:
+        for i in range(lo[n], hi[n] - 1):
+            if starts[flat[i + 1]] < starts[flat[i]]:
+                violations += 1
+                break
+
+    # Objective: makespan = maximum end time over all surgeries.
+    makespan = float(ends.max()) if ends.shape[0] else 1e6
+    return makespan, 1e6 * violations
+
+
+def _as_int64(values):
+    """
+    Converts a list of times or rooms to an int64 array.
+
+    Signed integer input is converted as is. Anything else is rounded to the nearest integer,
+    with NaN mapped to 0 and magnitudes clipped to 2**62; the number of entries changed this
+    way is returned as the second element so the caller can penalize them.
+    """
+    array = np.asarray(values)
+    if array.dtype.kind in "bi":
+        return array.astype(np.int64, copy=False), 0
+    array = array.astype(np.float64)
+    rounded = np.clip(np.nan_to_num(np.rint(array)), -_INT64_LIMIT, _INT64_LIMIT)
+    return rounded.astype(np.int64), int((rounded != array).sum())
+
+
+def _nurse_csr(nurse_assignment):
+    """
+    Flattens the per-nurse surgery lists into int64 CSR arrays (flat, offsets).
+
+    Entries that are not integers, integral floats such as 1.0 included, and integers too
+    large for int64 become -1, so the kernel drops and penalizes them like any other
+    out-of-range surgery index.
+    """
+    entries = [s for surgeries in nurse_assignment for s in surgeries]
+    flat = np.array(entries)
+    if flat.ndim != 1 or flat.dtype.kind not in "bi":
+        flat = np.array([s if isinstance(s, (int, np.integer)) and -1 <= s < _INT64_LIMIT else -1
+                         for s in entries], dtype=np.int64)
+    offsets = np.array([0] + [len(surgeries) for surgeries in nurse_assignment]).cumsum()
+    return flat.astype(np.int64, copy=False), offsets
+
+
+@njit(cache=True)
+def _random_nurse_lists(k, num_nurses, surgery_start, draws):
+    """
+    Nurse part of SurgeriesSchedulingProblem.random_solution, compiled with numba.
+
+    Surgery s gets k[s] distinct nurses from Floyd's algorithm: step i draws t uniformly from
+    [0, j] with j = num_nurses - k[s] + i, using draws[s, i] in [0, 1), and takes j instead if
+    t is already picked. Every k[s]-subset is equally likely and only k[s] draws are made.
+
+    Returns the nurse lists in CSR form (flat, offsets), each list sorted by start time.
+    """
+    num_surgeries = k.shape[0]
+    picks = np.empty(draws.shape, dtype=np.int64)
+    counts = np.zeros(num_nurses + 1, dtype=np.int64)
+    for s in range(num_surgeries):
+        for i in range(k[s]):
+            j = num_nurses - k[s] + i
+            # The product can round up to j + 1 when draws[s, i] is just below 1.
+            t = min(int(draws[s, i] * (j + 1)), j)
+            for p in range(i):
+                if picks[s, p] == t:
+                    t = j
+                    break
+            picks[s, i] = t
+            counts[t + 1] += 1
+
+    # Fill the lists visiting surgeries in start order (a stable sort keeps ties by index).
+    offsets = np.cumsum(counts)
+    fill = offsets[:-1].copy()
+    flat = np.empty(offsets[-1], dtype=np.int64)
+    for s in np.argsort(surgery_start, kind="mergesort"):
+        for i in range(k[s]):
+            n = picks[s, i]
+            flat[fill[n]] = s
+            fill[n] += 1
+    return flat, offsets
+
 
 class SurgeriesSchedulingProblem(BaseProblem):
     """
@@ -24,8 +208,9 @@ class SurgeriesSchedulingProblem(BaseProblem):
     solutions are penalized heavily.
     """
     
-    def __init__(self, instance_file):
+    def __init__(self, instance_file, seed=None):
         # Read instance data from file.
+        # seed is passed to np.random.default_rng and makes random_solution reproducible.
         # File format:
         #   Line 1: num_rooms num_nurses num_surgeries
         #   Line 2: min_start for each surgery (in hours)
@@ -42,8 +227,9 @@ class SurgeriesSchedulingProblem(BaseProblem):
             base_dir = os.path.dirname(os.path.abspath(__file__))
             instance_file = os.path.join(base_dir, instance_file)
 
-        with open(instance_file) as f:
-            lines = [line.strip() for line in f if line.strip()]
+        # Read the whole file at once and drop blank lines.
+        text = pathlib.Path(instance_file).read_text()
+        lines = [line for line in map(str.strip, text.splitlines()) if line]
         first_line = lines[0].split()
         self.num_rooms = int(first_line[0])
         self.num_nurses = int(first_line[1])
@@ -61,42 +247,95 @@ class SurgeriesSchedulingProblem(BaseProblem):
         self.max_shift_duration   = int(lines[7].split()[0])*60
         
         # Incompatible rooms for each surgery (next num_surgeries lines)
-        self.incompatible_rooms = []
-        for s in range(self.num_surgeries):
-            incompat_line = lines[8+s].split()
-            self.incompatible_rooms.append([int(x) for x in incompat_line[:self.num_rooms]])
+        incompat_block = io.StringIO("\n".join(lines[8:8 + self.num_surgeries]))
+        incompat = np.loadtxt(incompat_block, dtype=np.int8, ndmin=2)[:, :self.num_rooms]
+        self.incompatible_rooms = incompat.tolist()
+
+        # int32 array copies of the instance data, used by evaluate_solution and its kernel so
+        # that no Python list is indexed per call. The lists above remain the public attributes;
+        # the copies are taken once here, so later edits to the lists are not seen by the evaluator.
+        self._min_start_np = np.array(self.min_start, dtype=np.int32)
+        self._max_end_np = np.array(self.max_end, dtype=np.int32)
+        self._duration_np = np.array(self.duration, dtype=np.int32)
+        self._needed_nurses_np = np.array(self.needed_nurses, dtype=np.int32)
+        self._shift_early_np = np.array(self.shift_earliest_start, dtype=np.int32)
+        self._shift_late_np = np.array(self.shift_latest_end, dtype=np.int32)
+        # The surgery data read by the kernel, as rows of (min_start, max_end, duration).
+        self._sdata = np.stack([self._min_start_np, self._max_end_np, self._duration_np], axis=1)
+
+        # Incompatible rooms as a bitmask, 64 rooms per uint64 word.
+        words = (self.num_rooms + 63) // 64
+        incompat_bits = np.zeros((self.num_surgeries, words * 64), dtype=np.bool_)
+        incompat_bits[:, :self.num_rooms] = incompat == 1
+        packed = np.packbits(incompat_bits, axis=1, bitorder="little")
+        self._incompat_mask = packed.view("<u8").astype(np.uint64)
+
+        # The kernel with this instance's data already bound.
+        self._evaluate = functools.partial(
+            _evaluate, self._sdata, self._needed_nurses_np, self._incompat_mask,
+            self._shift_early_np, self._shift_late_np, self.max_shift_duration, self.num_rooms)
+
+        self._rng = np.random.default_rng(seed)
     
     def evaluate_solution(self, candidate) -> float:
-        penalty = 0
         # Unpack candidate solution.
         surgery_room = candidate.get("surgery_room", [])
         surgery_start = candidate.get("surgery_start", [])
         surgery_end = candidate.get("surgery_end", [])
         nurse_assignment = candidate.get("nurse_assignment", [])
         
-        # Check basic lengths.
+        # Check basic lengths. Malformed candidates are rejected outright, before any
+        # array is built; an infinite score ranks them below every well-formed candidate.
         if len(surgery_room) != self.num_surgeries or \
            len(surgery_start) != self.num_surgeries or \
-           len(surgery_end) != self.num_surgeries:
-            penalty += 1e6
+           len(surgery_end) != self.num_surgeries or \
+           len(nurse_assignment) != self.num_nurses:
+            return float("inf")
+        
+        # Times and rooms that are not integers are rounded and penalized.
+        starts, start_adjusted = _as_int64(surgery_start)
+        ends, end_adjusted = _as_int64(surgery_end)
+        rooms, room_adjusted = _as_int64(surgery_room)
+        adjusted = start_adjusted + end_adjusted + room_adjusted
+        
+        flat, offsets = _nurse_csr(nurse_assignment)
+        makespan, kernel_penalty = self._evaluate(starts, ends, rooms, flat, offsets)
+        value = makespan + 1e6 * adjusted + kernel_penalty
+        
+        # The reference only covers candidates the original evaluation could score.
+        if _CHECK_REFERENCE and adjusted == 0 and \
+           np.asarray(surgery_room).dtype.kind in "bi" and \
+           ((rooms >= 0) & (rooms < self.num_rooms)).all() and \
+           ((flat >= 0) & (flat < self.num_surgeries)).all():
+            expected = self._evaluate_reference(surgery_room, surgery_start, surgery_end,
+                                                 nurse_assignment)
+            if not math.isclose(value, expected, rel_tol=1e-12):
+                raise AssertionError(
+                    f"evaluate_solution returned {value}, reference evaluation gives {expected}")
+        return value
+
+    def _evaluate_reference(self, surgery_room, surgery_start, surgery_end, nurse_assignment):
+        """
+        The original plain-Python evaluation, kept as a slow reference for a well-formed candidate
+        whose rooms and nurse entries are all in range (the original code raised on anything
+        else). Used only to cross-check evaluate_solution when the
+        SURGERIES_SCHEDULING_CHECK_REFERENCE environment variable is set.
+        """
+        penalty = 0
         
         # Verify each surgery's time constraints.
         for s in range(self.num_surgeries):
-            if s < len(surgery_start) and s < len(surgery_end):
-                if surgery_start[s] < self.min_start[s]:
-                    penalty += 1e6 * (self.min_start[s] - surgery_start[s])
-                if surgery_end[s] > self.max_end[s]:
-                    penalty += 1e6 * (surgery_end[s] - self.max_end[s])
-                if surgery_end[s] - surgery_start[s] != self.duration[s]:
-                    penalty += 1e6 * abs((surgery_end[s] - surgery_start[s]) - self.duration[s])
-            else:
-                penalty += 1e6
+            if surgery_start[s] < self.min_start[s]:
+                penalty += 1e6 * (self.min_start[s] - surgery_start[s])
+            if surgery_end[s] > self.max_end[s]:
+                penalty += 1e6 * (surgery_end[s] - self.max_end[s])
+            if surgery_end[s] - surgery_start[s] != self.duration[s]:
+                penalty += 1e6 * abs((surgery_end[s] - surgery_start[s]) - self.duration[s])
         
         # Check room assignment compatibility.
         room_assignments = {r: [] for r in range(self.num_rooms)}
         for s, r in enumerate(surgery_room):
-            # If r is out-of-range or surgery s is incompatible with room r, add penalty.
-            if r < 0 or r >= self.num_rooms or self.incompatible_rooms[s][r] == 1:
+            if self.incompatible_rooms[s][r] == 1:
                 penalty += 1e6
             room_assignments[r].append(s)
         
@@ -111,12 +350,11 @@ class SurgeriesSchedulingProblem(BaseProblem):
                     penalty += 1e6 * (surgery_end[s1] - surgery_start[s2])
         
         # Check nurse assignment.
-        # Each nurse's list must be in non-decreasing order of start times and respect shift limits.
         for n in range(self.num_nurses):
-            assigned = nurse_assignment[n] if n < len(nurse_assignment) else []
+            assigned = nurse_assignment[n]
             if assigned:
                 sorted_assigned = sorted(assigned, key=lambda s: surgery_start[s])
-                if assigned != sorted_assigned:
+                if list(assigned) != sorted_assigned:
                     penalty += 1e6
                 first_start = surgery_start[assigned[0]]
                 last_end = surgery_end[assigned[-1]]
@@ -136,11 +374,7 @@ class SurgeriesSchedulingProblem(BaseProblem):
             if nurse_count[s] < self.needed_nurses[s]:
                 penalty += 1e6 * (self.needed_nurses[s] - nurse_count[s])
         
-        # Objective: makespan = maximum end time over all surgeries.
-        if surgery_end:
-            makespan = max(surgery_end)
-        else:
-            makespan = 1e6
+        makespan = max(surgery_end) if len(surgery_end) else 1e6
         return makespan + penalty
 
     def random_solution(self):
@@ -156,37 +390,26 @@ class SurgeriesSchedulingProblem(BaseProblem):
             and add surgery s to their assignments.
           - Then, for each nurse, sort their assigned surgeries by start time.
         """
-        surgery_room = []
-        surgery_start = []
-        surgery_end = []
-        for s in range(self.num_surgeries):
-            # Random room selection.
-            r = random.randint(0, self.num_rooms - 1)
-            surgery_room.append(r)
-            latest_start = self.max_end[s] - self.duration[s]
-            if latest_start < self.min_start[s]:
-                st = self.min_start[s]
-            else:
-                st = random.randint(self.min_start[s], latest_start)
-            surgery_start.append(st)
-            surgery_end.append(st + self.duration[s])
+        rng = self._rng
+        # Random rooms and start times, drawn for all surgeries at once.
+        surgery_room = rng.integers(0, self.num_rooms, size=self.num_surgeries)
+        latest_start = np.maximum(self._max_end_np - self._duration_np, self._min_start_np)
+        surgery_start = rng.integers(self._min_start_np, latest_start, endpoint=True)
+        surgery_end = surgery_start + self._duration_np
         
-        # For each surgery, assign it to a random subset of nurses of size needed_nurses[s].
-        nurse_assignment = [[] for _ in range(self.num_nurses)]
-        for s in range(self.num_surgeries):
-            if self.needed_nurses[s] > self.num_nurses:
-                assigned = list(range(self.num_nurses))
-            else:
-                assigned = random.sample(range(self.num_nurses), self.needed_nurses[s])
-            for n in assigned:
-                nurse_assignment[n].append(s)
-        # For each nurse, sort their assigned surgeries by start time.
-        for n in range(self.num_nurses):
-            nurse_assignment[n].sort(key=lambda s: surgery_start[s])
+        # For each surgery, pick needed_nurses[s] distinct nurses (every nurse when more are
+        # needed than available), then group the surgeries by nurse.
+        k = np.minimum(self._needed_nurses_np, self.num_nurses)
+        width = int(k.max()) if self.num_surgeries else 0
+        draws = rng.random((self.num_surgeries, width))
+        flat, offsets = _random_nurse_lists(k, self.num_nurses, surgery_start, draws)
+        flat = flat.tolist()
+        offsets = offsets.tolist()
+        nurse_assignment = [flat[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
         
         return {
-            "surgery_room": surgery_room,
-            "surgery_start": surgery_start,
-            "surgery_end": surgery_end,
+            "surgery_room": surgery_room.tolist(),
+            "surgery_start": surgery_start.tolist(),
+            "surgery_end": surgery_end.tolist(),
             "nurse_assignment": nurse_assignment
         }
@@ -0,0 +1,67 @@
+import copy
+
+import numpy as np
+import pytest
+
+pytest.importorskip("qubots")
+
+from surgeries_scheduling_problem import SurgeriesSchedulingProblem
+
+
+def _write_instance(path, num_rooms, num_nurses, num_surgeries, seed):
+    rng = np.random.default_rng(seed)
+    min_start = rng.integers(6, 12, size=num_surgeries)
+    lines = [
+        f"{num_rooms} {num_nurses} {num_surgeries}",
+        " ".join(map(str, min_start)),
+        " ".join(map(str, min_start + rng.integers(2, 10, size=num_surgeries))),
+        " ".join(map(str, rng.integers(30, 240, size=num_surgeries))),
+        " ".join(map(str, rng.integers(1, 4, size=num_surgeries))),
+        " ".join(map(str, rng.integers(6, 10, size=num_nurses))),
+        " ".join(map(str, rng.integers(14, 22, size=num_nurses))),
+        "8",
+    ]
+    for row in rng.random((num_surgeries, num_rooms)) < 0.3:
+        lines.append(" ".join(map(str, row.astype(int))))
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def _perturbed(candidate, rng, num_rooms):
+    candidate = copy.deepcopy(candidate)
+    s = int(rng.integers(len(candidate["surgery_start"])))
+    nurse_lists = candidate["nurse_assignment"]
+    n = int(rng.integers(len(nurse_lists)))
+    move = rng.integers(5)
+    if move == 0:
+        delta = int(rng.integers(-300, 300))
+        candidate["surgery_start"][s] += delta
+        candidate["surgery_end"][s] += delta
+    elif move == 1:
+        candidate["surgery_end"][s] += int(rng.integers(-60, 60))
+    elif move == 2:
+        candidate["surgery_room"][s] = int(rng.integers(num_rooms))
+    elif move == 3:
+        nurse_lists[n].reverse()
+    elif nurse_lists[n]:
+        nurse_lists[n].pop(int(rng.integers(len(nurse_lists[n]))))
+    return candidate
+
+
+def _problems(tmp_path):
+    yield SurgeriesSchedulingProblem("instances/instancesurgery.txt", seed=0)
+    path = _write_instance(tmp_path / "many_rooms.txt", 70, 12, 40, seed=1)
+    yield SurgeriesSchedulingProblem(path, seed=2)
+
+
+def test_evaluate_solution_matches_reference(tmp_path):
+    rng = np.random.default_rng(3)
+    for problem in _problems(tmp_path):
+        for _ in range(50):
+            candidate = problem.random_solution()
+            for _ in range(5):
+                expected = problem._evaluate_reference(
+                    candidate["surgery_room"], candidate["surgery_start"],
+                    candidate["surgery_end"], candidate["nurse_assignment"])
+                assert problem.evaluate_solution(candidate) == pytest.approx(expected, rel=1e-12)
+                candidate = _perturbed(candidate, rng, problem.num_rooms)